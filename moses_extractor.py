@@ -6,281 +6,229 @@ Extracts damage stability data matching Table 10.4.2 format
 
 import re
 from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
 from openpyxl.utils import get_column_letter
 
+# Report styles (openpyxl style objects are immutable, so they are shared)
+_TITLE_FONT = Font(name='Arial', size=14, bold=True)
+_TITLE_ALIGNMENT = Alignment(horizontal='center', vertical='center')
+
+_HEADER_FONT = Font(name='Arial', size=10, bold=True, color='000000')
+_HEADER_FILL = PatternFill(start_color='D3D3D3', end_color='D3D3D3', fill_type='solid')
+_HEADER_ALIGNMENT = Alignment(horizontal='center', vertical='center', wrap_text=True)
+
+_DATA_FONT = Font(name='Arial', size=10)
+_DATA_ALIGNMENT = Alignment(horizontal='center', vertical='center')
+
+_BORDER = Border(
+    left=Side(style='thin', color='000000'),
+    right=Side(style='thin', color='000000'),
+    top=Side(style='thin', color='000000'),
+    bottom=Side(style='thin', color='000000')
+)
+
+# Report title and header rows (None marks cells covered by a merged range)
+_TITLE = 'Table 10.4.2 Damage Stability Results'
+_MAIN_HEADERS = ('Case\nNo.', 'Draft Mark (m)', None, None, None,
+                 'Heel\n(deg)', 'Trim\n(deg)', 'Wind Area Ratio', None, 'Remarks')
+_SUB_HEADERS = ('', 'Aft\nPort', 'Aft\nStbd', 'Fwd\nPort', 'Fwd\nStbd',
+                '', '', 'Actual', 'Required', '')
+
+# Column widths and their precomputed column letters
+_COLUMN_WIDTHS = (8, 10, 10, 10, 10, 8, 8, 10, 10, 10)
+_COLUMN_LETTERS = tuple(get_column_letter(col_num)
+                        for col_num in range(1, len(_COLUMN_WIDTHS) + 1))
+
+# Named style per report column (Case, 4 drafts, Heel, Trim, Actual, Required, Remarks)
+_DATA_COLUMN_STYLES = ['moses_text'] + ['moses_data'] * 7 + ['moses_ratio', 'moses_text']
+
+def _add_named_styles(wb):
+    """Register the report's named styles so each cell needs a single style lookup"""
+    wb.add_named_style(NamedStyle(name='moses_title', font=_TITLE_FONT,
+                                  alignment=_TITLE_ALIGNMENT))
+    wb.add_named_style(NamedStyle(name='moses_header', font=_HEADER_FONT, fill=_HEADER_FILL,
+                                  alignment=_HEADER_ALIGNMENT, border=_BORDER))
+    for name, number_format in (('moses_text', 'General'),
+                                ('moses_data', '0.00'),
+                                ('moses_ratio', '0.0')):
+        wb.add_named_style(NamedStyle(name=name, font=_DATA_FONT, alignment=_DATA_ALIGNMENT,
+                                      border=_BORDER, number_format=number_format))
+
+# Line patterns, each run only after a cheap substring guard has matched the line
+_CASE_RE = re.compile(r'Case-(\d+)\s*\(Compartment\s+(\w+)\s+Flooded\)', re.ASCII)
+_DAMAGE_RE = re.compile(r'Damage = (\w+)\s', re.ASCII)
+_DAMAGE_ID_RE = re.compile(r'(\d+)', re.ASCII)
+_DRAFT_RE = re.compile(r'(\w+\([PS]\))\s+([\d.]+)', re.ASCII)
+_ROLL_RE = re.compile(r'Roll\s*=\s*([-\d.]+)\s*Deg', re.ASCII)
+_PITCH_RE = re.compile(r'Pitch\s*=\s*([-\d.]+)\s*Deg', re.ASCII)
+_AREA_RE = re.compile(r'Area Ratio\s+>=\s+([\d.]+)\s+([\d.]+)\s+Passes', re.ASCII)
+
+def _case_sort_key(case):
+    """Order cases as Intact first, then damage cases numerically"""
+    return (case != 'Intact', int(case) if case.isdigit() else 0)
+
 def extract_moses_data(file_path):
     """
     Extract complete damage stability data from MOSES output file
     
+    A case's record is complete when its area ratio line is read, so no
+    separate join pass is needed. The record uses the case's last draft
+    mark reading seen before that line: a case whose stability summary
+    comes before any draft marks is skipped, and draft marks read after
+    the case's last summary are ignored.
+    
     Returns:
         list: List of dictionaries containing all required stability data
     """
-    with open(file_path, 'r') as f:
-        content = f.read()
-    
-    results = []
-    lines = content.split('\n')
-    
-    # Process in two passes: first collect stability data, then match with drafts
-    stability_data = {}
-    draft_data = {}
+    records = {}
     
     current_case = None
     in_stability_summary = False
     in_draft_marks = False
     temp_heel = None
     temp_trim = None
-    temp_drafts = {}
+    case_drafts = {}
     
-    for i, line in enumerate(lines):
-        line_stripped = line.strip()
-        
-        # Detect damage case from section headers or VCG line
-        if 'DAMAGE STABILITY Case-' in line_stripped:
-            match = re.search(r'Case-(\d+)\s*\(Compartment\s+(\w+)\s+Flooded\)', line_stripped)
-            if match:
-                current_case = match.group(1)
-        elif 'INTACT TOW CONDITION' in line_stripped:
-            current_case = 'Intact'
-        elif 'Damage = NONE' in line_stripped and 'VCG' in line_stripped:
-            current_case = 'Intact'
-        elif 'Damage =' in line_stripped and 'VCG' in line_stripped:
-            # Extract case from "Damage = XPO" format
-            match = re.search(r'Damage = (\w+)\s', line_stripped)
-            if match:
-                damage_id = match.group(1)
-                if damage_id != 'NONE!':
-                    # Extract case number from damage ID (e.g., "1PO" -> "1")
-                    case_match = re.search(r'(\d+)', damage_id)
-                    if case_match:
-                        current_case = case_match.group(1)
-        
-        # Detect draft mark readings section
-        if '+++ D R A F T   M A R K   R E A D I N G S +++' in line_stripped:
-            in_draft_marks = True
-            temp_drafts = {}
-            continue
-        
-        # Parse draft marks
-        if in_draft_marks and 'AFT(P)' in line_stripped and 'AFT(S)' in line_stripped:
-            draft_pattern = r'(\w+\([PS]\))\s+([\d.]+)'
-            matches = re.findall(draft_pattern, line_stripped)
+    # Stream the file line by line. All markers are ASCII and latin-1 maps
+    # every byte to one character, so decoding never fails and no full copy
+    # of the file is held in memory.
+    with open(file_path, 'r', encoding='latin-1') as f:
+        for line in f:
+            # Detect damage case from section headers or VCG line
+            if 'DAMAGE STABILITY Case-' in line:
+                match = _CASE_RE.search(line)
+                if match:
+                    current_case = match.group(1)
+            elif 'INTACT TOW CONDITION' in line:
+                current_case = 'Intact'
+            elif 'Damage =' in line and 'VCG' in line:
+                line_stripped = line.strip()
+                if 'Damage = NONE' in line_stripped:
+                    current_case = 'Intact'
+                else:
+                    # Extract case from "Damage = XPO" format
+                    match = _DAMAGE_RE.search(line_stripped)
+                    if match:
+                        # Extract case number from damage ID (e.g., "1PO" -> "1")
+                        case_match = _DAMAGE_ID_RE.search(match.group(1))
+                        if case_match:
+                            current_case = case_match.group(1)
             
-            for name, value in matches:
-                if name not in ['MEAN(P)', 'MEAN(S)']:
-                    temp_drafts[name] = float(value)
+            # Section headers
+            if '+++' in line:
+                if '+++ D R A F T   M A R K   R E A D I N G S +++' in line:
+                    in_draft_marks = True
+                    continue
+                if '+++ S T A B I L I T Y   S U M M A R Y +++' in line:
+                    in_stability_summary = True
+                    temp_heel = None
+                    temp_trim = None
+                    continue
             
-            if current_case and temp_drafts:
-                draft_data[current_case] = temp_drafts.copy()
+            # Parse draft marks; the last complete reading for a case is kept
+            # until its stability summary, which MOSES prints after it
+            if in_draft_marks and 'AFT(P)' in line and 'AFT(S)' in line:
+                temp_drafts = {}
+                for name, value in _DRAFT_RE.findall(line):
+                    if name not in ['MEAN(P)', 'MEAN(S)']:
+                        temp_drafts[name] = float(value)
+                if current_case and temp_drafts:
+                    case_drafts[current_case] = temp_drafts
+                in_draft_marks = False
             
-            in_draft_marks = False
-        
-        # Detect stability summary section
-        if '+++ S T A B I L I T Y   S U M M A R Y +++' in line_stripped:
-            in_stability_summary = True
-            temp_heel = None
-            temp_trim = None
-            continue
-        
-        # Extract Roll (Heel) and Pitch (Trim)
-        if in_stability_summary:
-            if 'Roll' in line_stripped and '=' in line_stripped and 'Deg' in line_stripped:
-                roll_match = re.search(r'Roll\s*=\s*([-\d.]+)\s*Deg', line_stripped)
-                if roll_match:
-                    temp_heel = float(roll_match.group(1))
+            if not in_stability_summary:
+                continue
             
-            if 'Pitch' in line_stripped and '=' in line_stripped and 'Deg' in line_stripped:
-                pitch_match = re.search(r'Pitch\s*=\s*([-\d.]+)\s*Deg', line_stripped)
-                if pitch_match:
-                    temp_trim = float(pitch_match.group(1))
-        
-        # Extract Area Ratio
-        if in_stability_summary and 'Area Ratio' in line_stripped and 'Passes' in line_stripped:
-            match = re.search(r'Area Ratio\s+>=\s+([\d.]+)\s+([\d.]+)\s+Passes', line_stripped)
-            if match:
-                required_ratio = float(match.group(1))
-                actual_ratio = float(match.group(2))
-                
-                if current_case:
-                    stability_data[current_case] = {
-                        'heel': temp_heel if temp_heel is not None else 0.0,
-                        'trim': temp_trim if temp_trim is not None else 0.0,
-                        'area_ratio_actual': actual_ratio,
-                        'area_ratio_required': required_ratio
-                    }
-                
-                in_stability_summary = False
-    
-    # Now combine stability data with draft data
-    for case in sorted(stability_data.keys(), key=lambda x: (x != 'Intact', int(x) if x.isdigit() else 0)):
-        if case in draft_data:
-            results.append({
-                'case': case,
-                'drafts': draft_data[case],
-                'heel': stability_data[case]['heel'],
-                'trim': stability_data[case]['trim'],
-                'area_ratio_actual': stability_data[case]['area_ratio_actual'],
-                'area_ratio_required': stability_data[case]['area_ratio_required'],
-                'remarks': 'Pass'
-            })
+            # Extract Roll (Heel) and Pitch (Trim)
+            if 'Roll' in line and '=' in line and 'Deg' in line:
+                match = _ROLL_RE.search(line)
+                if match:
+                    temp_heel = float(match.group(1))
+            
+            if 'Pitch' in line and '=' in line and 'Deg' in line:
+                match = _PITCH_RE.search(line)
+                if match:
+                    temp_trim = float(match.group(1))
+            
+            # Extract Area Ratio
+            if 'Area Ratio' in line and 'Passes' in line:
+                match = _AREA_RE.search(line)
+                if match:
+                    # A later summary for the same case replaces the earlier record
+                    if current_case in case_drafts:
+                        records[current_case] = {
+                            'case': current_case,
+                            'drafts': case_drafts[current_case],
+                            'heel': temp_heel if temp_heel is not None else 0.0,
+                            'trim': temp_trim if temp_trim is not None else 0.0,
+                            'area_ratio_actual': float(match.group(2)),
+                            'area_ratio_required': float(match.group(1)),
+                            'remarks': 'Pass'
+                        }
+                    in_stability_summary = False
     
-    return results
+    return sorted(records.values(), key=lambda record: _case_sort_key(record['case']))
+
+def _styled_cell(ws, value, style):
+    """Create a write-only cell carrying one of the report's named styles"""
+    cell = WriteOnlyCell(ws, value=value)
+    cell.style = style
+    return cell
+
+def _report_row(record):
+    """Return the Table 10.4.2 column values for one extracted record"""
+    drafts = record['drafts']
+    return (
+        record['case'],
+        drafts.get('AFT(P)'),
+        drafts.get('AFT(S)'),
+        drafts.get('FWD(P)'),
+        drafts.get('FWD(S)'),
+        record['heel'],
+        record['trim'],
+        record['area_ratio_actual'],
+        record['area_ratio_required'],
+        record['remarks']
+    )
 
 def create_excel_report(data, output_path):
     """
     Create formatted Excel report matching Table 10.4.2 format
     
+    Rows are streamed to disk through a write-only workbook, so column
+    widths, row heights and merged ranges are declared before any row is
+    appended.
+    
     Args:
         data: List of dictionaries with stability information
         output_path: Path to save the Excel file
     """
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Damage Stability Results"
-    
-    # Define styles
-    title_font = Font(name='Arial', size=14, bold=True)
-    title_alignment = Alignment(horizontal='center', vertical='center')
-    
-    header_font = Font(name='Arial', size=10, bold=True, color='000000')
-    header_fill = PatternFill(start_color='D3D3D3', end_color='D3D3D3', fill_type='solid')
-    header_alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-    
-    data_font = Font(name='Arial', size=10)
-    data_alignment = Alignment(horizontal='center', vertical='center')
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Damage Stability Results")
+    _add_named_styles(wb)
     
-    border = Border(
-        left=Side(style='thin', color='000000'),
-        right=Side(style='thin', color='000000'),
-        top=Side(style='thin', color='000000'),
-        bottom=Side(style='thin', color='000000')
-    )
+    # Column widths
+    for letter, width in zip(_COLUMN_LETTERS, _COLUMN_WIDTHS):
+        ws.column_dimensions[letter].width = width
     
-    # Title
-    ws.merge_cells('A1:J1')
-    ws['A1'] = 'Table 10.4.2 Damage Stability Results'
-    ws['A1'].font = title_font
-    ws['A1'].alignment = title_alignment
     ws.row_dimensions[1].height = 25
-    
-    # Main headers (Row 2)
-    main_headers = [
-        ('A2', 'Case\nNo.', 1),
-        ('B2', 'Draft Mark (m)', 4),
-        ('F2', 'Heel\n(deg)', 1),
-        ('G2', 'Trim\n(deg)', 1),
-        ('H2', 'Wind Area Ratio', 2),
-        ('J2', 'Remarks', 1)
-    ]
-    
-    for cell_ref, text, merge_cols in main_headers:
-        if merge_cols > 1:
-            start_col = cell_ref[0]
-            end_col = chr(ord(start_col) + merge_cols - 1)
-            ws.merge_cells(f'{start_col}2:{end_col}2')
-        
-        cell = ws[cell_ref]
-        cell.value = text
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_alignment
-        cell.border = border
-    
-    # Sub headers (Row 3)
-    sub_headers = [
-        ('A3', ''),
-        ('B3', 'Aft\nPort'),
-        ('C3', 'Aft\nStbd'),
-        ('D3', 'Fwd\nPort'),
-        ('E3', 'Fwd\nStbd'),
-        ('F3', ''),
-        ('G3', ''),
-        ('H3', 'Actual'),
-        ('I3', 'Required'),
-        ('J3', '')
-    ]
-    
-    for cell_ref, text in sub_headers:
-        cell = ws[cell_ref]
-        cell.value = text
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_alignment
-        cell.border = border
-    
     ws.row_dimensions[2].height = 30
     ws.row_dimensions[3].height = 25
     
-    # Data rows
-    for row_num, record in enumerate(data, 4):
-        # Case number
-        cell = ws.cell(row=row_num, column=1)
-        cell.value = record['case']
-        cell.font = data_font
-        cell.alignment = data_alignment
-        cell.border = border
-        
-        # Draft marks
-        draft_mapping = {
-            2: 'AFT(P)',
-            3: 'AFT(S)',
-            4: 'FWD(P)',
-            5: 'FWD(S)'
-        }
-        
-        for col_num, draft_name in draft_mapping.items():
-            cell = ws.cell(row=row_num, column=col_num)
-            cell.value = record['drafts'].get(draft_name, None)
-            if cell.value is not None:
-                cell.number_format = '0.00'
-            cell.font = data_font
-            cell.alignment = data_alignment
-            cell.border = border
-        
-        # Heel (deg)
-        cell = ws.cell(row=row_num, column=6)
-        cell.value = record['heel']
-        cell.number_format = '0.00'
-        cell.font = data_font
-        cell.alignment = data_alignment
-        cell.border = border
-        
-        # Trim (deg)
-        cell = ws.cell(row=row_num, column=7)
-        cell.value = record['trim']
-        cell.number_format = '0.00'
-        cell.font = data_font
-        cell.alignment = data_alignment
-        cell.border = border
-        
-        # Wind Area Ratio - Actual
-        cell = ws.cell(row=row_num, column=8)
-        cell.value = record['area_ratio_actual']
-        cell.number_format = '0.00'
-        cell.font = data_font
-        cell.alignment = data_alignment
-        cell.border = border
-        
-        # Wind Area Ratio - Required
-        cell = ws.cell(row=row_num, column=9)
-        cell.value = record['area_ratio_required']
-        cell.number_format = '0.0'
-        cell.font = data_font
-        cell.alignment = data_alignment
-        cell.border = border
-        
-        # Remarks
-        cell = ws.cell(row=row_num, column=10)
-        cell.value = record['remarks']
-        cell.font = data_font
-        cell.alignment = data_alignment
-        cell.border = border
+    # Merged header ranges
+    for cell_range in ('A1:J1', 'B2:E2', 'H2:I2'):
+        ws.merged_cells.add(cell_range)
     
-    # Column widths
-    column_widths = [8, 10, 10, 10, 10, 8, 8, 10, 10, 10]
-    for col_num, width in enumerate(column_widths, 1):
-        ws.column_dimensions[get_column_letter(col_num)].width = width
+    # Title, main headers (Row 2) and sub headers (Row 3)
+    ws.append([_styled_cell(ws, _TITLE, 'moses_title')])
+    for headers in (_MAIN_HEADERS, _SUB_HEADERS):
+        ws.append([_styled_cell(ws, text, 'moses_header') for text in headers])
+    
+    # Data rows: plain value tuples, wrapped in styled cells on append
+    for row in map(_report_row, data):
+        ws.append([_styled_cell(ws, value, style)
+                   for value, style in zip(row, _DATA_COLUMN_STYLES)])
     
     # Save workbook
     wb.save(output_path)